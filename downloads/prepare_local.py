@@ -1,17 +1,56 @@
 #!/usr/bin/env python3
 import os
 import json
+import re
+import shlex
+import shutil
+import struct
+import subprocess
 import xml.etree.ElementTree as et
 from argparse import ArgumentParser, Namespace
-from subprocess import check_output
-from typing import Dict, List, Any, Optional
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from subprocess import CalledProcessError, check_output
+from typing import Dict, List, Any, Optional, Tuple, Union
 from xml.etree.ElementTree import tostring
 
-
-def run_cmd(cmd: str, verbose: bool = False) -> str:
+try:
+    import orjson  # optional, noticeably faster on large per-frame VMAF logs
+except ImportError:
+    orjson = None
+
+# Numbered media segments written by MP4Box (1.m4s, 2.m4s, ...)
+SEGMENT_RE = re.compile(r"^[0-9]+\.m4s$")
+# Namespace of the MP4Box-generated MPDs, for ElementTree lookups
+MPD_NS = {"d": "urn:mpeg:dash:schema:mpd:2011"}
+# Segments are decoded at this frame rate for VMAF (speeds it up)
+VMAF_FPS = 10
+# Minimum threads per VMAF scoring process (vmafossexec / libvmaf)
+VMAF_THREADS = 4
+
+# The CWD never changes while this script runs, so resolved paths can be cached
+abspath = lru_cache(maxsize=None)(os.path.abspath)
+
+
+def run_cmd(
+    cmd: Union[str, List[str]],
+    verbose: bool = False,
+    capture: bool = True,
+    cwd: Optional[str] = None,
+) -> str:
+    """
+    Run cmd through the shell if it is a string, or directly if it is an argv list.
+    Returns stdout when capture is set; otherwise stdout is discarded.
+    """
+    shell = isinstance(cmd, str)
     if verbose:
-        print(f"> {cmd}")
-    return check_output(cmd, shell=True).decode("utf-8")
+        print(f"> {cmd if shell else ' '.join(shlex.quote(a) for a in cmd)}")
+    if capture:
+        return check_output(cmd, shell=shell, cwd=cwd).decode("utf-8")
+    subprocess.run(cmd, shell=shell, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+    return ""
 
 
 def ensure_dir(p: str) -> None:
@@ -19,11 +58,100 @@ def ensure_dir(p: str) -> None:
 
 
 def rm(p: str) -> None:
-    run_cmd(f'rm -rf "{p}" || true')
+    run_cmd(["rm", "-rf", p], capture=False)
 
 
-def get_attr(raw_xml: str, attr: str) -> str:
-    return raw_xml.split(attr)[1].split('"')[1]
+def read_sidx_start(m4s_path: str) -> float:
+    """
+    Return earliest_presentation_time / timescale from the first top-level
+    sidx box of an ISO-BMFF segment (what MP4Box -diso reports as SegmentIndexBox).
+    """
+    with open(m4s_path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            size, box_type = struct.unpack(">I4s", header)
+            header_len = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header_len = 16
+
+            if box_type == b"sidx":
+                # version(1) flags(3) reference_ID(4) timescale(4) earliest_presentation_time(4|8)
+                version = f.read(4)[0]
+                _, timescale = struct.unpack(">II", f.read(8))
+                if version == 0:
+                    earliest = struct.unpack(">I", f.read(4))[0]
+                else:
+                    earliest = struct.unpack(">Q", f.read(8))[0]
+                return earliest / timescale
+
+            if size == 0:
+                break  # box extends to end of file
+            f.seek(size - header_len, os.SEEK_CUR)
+
+    raise RuntimeError(f"No sidx box found in {m4s_path}")
+
+
+def ffmpeg_lists(section: str, name: str) -> bool:
+    """
+    True if the ffmpeg on PATH lists name under -<section>
+    (e.g. ffmpeg_lists("filters", "libvmaf"), ffmpeg_lists("encoders", "h264_nvenc")).
+    The listing is streamed and ffmpeg is stopped as soon as name shows up.
+    """
+    proc = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-hide_banner", f"-{section}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    try:
+        for line in proc.stdout:
+            if line.split()[1:2] == [name]:
+                return True
+        return False
+    finally:
+        proc.stdout.close()
+        proc.terminate()
+        proc.wait()
+
+
+def pick_h264_encoder(requested: str) -> str:
+    """
+    Resolve --encoder: "auto" picks h264_nvenc when ffmpeg has it and a short
+    test encode succeeds (i.e. there is a usable GPU), else libx264.
+    """
+    if requested != "auto":
+        return requested
+    if ffmpeg_lists("encoders", "h264_nvenc"):
+        try:
+            run_cmd(
+                ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+                 "-f", "lavfi", "-i", "nullsrc=s=256x256:d=1", "-c:v", "h264_nvenc", "-f", "null", "-"],
+                capture=False,
+            )
+            return "h264_nvenc"
+        except CalledProcessError:
+            pass
+    return "libx264"
+
+
+def h264_encoder_args(encoder: str, r: int, gop: int, threads: int) -> List[str]:
+    """
+    Per-output encoder options for one rate, with a keyframe every gop frames
+    and no scene-cut keyframes in between.
+    """
+    rate_args = ["-b:v", f"{r}k", "-maxrate", f"{2*r}k", "-bufsize", f"{4*r}k"]
+    if encoder == "h264_nvenc":
+        return [
+            "-c:v", "h264_nvenc", "-preset", "slow", "-rc", "vbr",
+            "-g", str(gop), "-forced-idr", "1", "-no-scenecut", "1",
+        ] + rate_args
+    return [
+        "-c:v", "libx264", "-preset", "slow", "-threads", str(threads),
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+    ] + rate_args
 
 
 def transcode_h264_reps(
@@ -32,34 +160,48 @@ def transcode_h264_reps(
     rates_kbps: List[int],
     fps: int,
     seg_s: int,
+    encoder: str = "libx264",
 ) -> Dict[int, str]:
     """
     Create representations as MP4 files: rep_<rate>.mp4
-    Uses ffmpeg libx264 so it always works with MP4 input.
+    Uses ffmpeg libx264 by default so it always works with MP4 input;
+    encoder="h264_nvenc" encodes on the GPU instead, and encoder="auto" picks
+    NVENC when it works (see pick_h264_encoder), retrying with libx264 if the
+    NVENC encode fails (e.g. the driver's concurrent session limit).
+
+    All missing rates are encoded by a single ffmpeg process with one output
+    per rate, so the source is only read and decoded once.
 
     IMPORTANT: We force keyframes exactly at segment boundaries so MP4Box can
     create stable segment durations.
     """
     ensure_dir(out_dir)
-    out_map: Dict[int, str] = {}
-    gop = fps * seg_s  # e.g., 24fps * 5s = 120
-
-    for r in rates_kbps:
-        out_mp4 = os.path.join(out_dir, f"rep_{r}.mp4")
-        if os.path.isfile(out_mp4):
-            out_map[r] = out_mp4
-            continue
+    out_map: Dict[int, str] = {r: os.path.join(out_dir, f"rep_{r}.mp4") for r in rates_kbps}
+    missing = [r for r in rates_kbps if not os.path.isfile(out_map[r])]
+    if not missing:
+        return out_map
 
-        cmd = (
-            f'ffmpeg -y -i "{src_mp4}" '
-            f'-an -c:v libx264 -preset slow '
-            f'-r {fps} '
-            f'-g {gop} -keyint_min {gop} -sc_threshold 0 '
-            f'-b:v {r}k -maxrate {2*r}k -bufsize {4*r}k '
-            f'"{out_mp4}"'
-        )
-        run_cmd(cmd, verbose=True)
-        out_map[r] = out_mp4
+    gop = fps * seg_s  # e.g., 24fps * 5s = 120
+    # Split the cores between the parallel encoders so x264 doesn't oversubscribe
+    threads = max(1, (os.cpu_count() or 1) // len(missing))
+
+    def encode_cmd(enc: str) -> List[str]:
+        # Output options are per output file, so every rate gets its own full set
+        cmd = ["ffmpeg", "-nostdin", "-y", "-i", src_mp4]
+        for r in missing:
+            cmd += ["-map", "0:v:0", "-an", "-r", str(fps)] + h264_encoder_args(enc, r, gop, threads) + [out_map[r]]
+        return cmd
+
+    # Only probe for a GPU encoder when there is something to encode
+    chosen = pick_h264_encoder(encoder)
+    try:
+        run_cmd(encode_cmd(chosen), verbose=True, capture=False)
+    except CalledProcessError:
+        # The probe opens one NVENC session, this encode opens one per rate
+        if encoder != "auto" or chosen == "libx264":
+            raise
+        print(f"> {chosen} encode failed, retrying with libx264")
+        run_cmd(encode_cmd("libx264"), verbose=True, capture=False)
 
     return out_map
 
@@ -82,25 +224,31 @@ def segment_rep(video_name: str, rep_mp4: str, rate: int, seg_s: int) -> Dict[in
     seg_ms = seg_s * 1000
     # MP4Box writes <basename>_dash.mpd, init.mp4, *.m4s into CWD
     run_cmd(
-        f'cd "{tmp}" && MP4Box -dash {seg_ms} -dash-profile live -rap -segment-name "" "{os.path.abspath(rep_mp4)}"',
-        verbose=True
+        ["MP4Box", "-dash", str(seg_ms), "-dash-profile", "live", "-rap", "-segment-name", "",
+         abspath(rep_mp4)],
+        verbose=True,
+        capture=False,
+        cwd=tmp,
     )
 
     # Move outputs (MPD name depends on input basename)
-    run_cmd(f'mv "{tmp}"/*_dash.mpd "{segment_dir}/intermediate_dash.mpd"')
-    run_cmd(f'mv "{tmp}/init.mp4" "{segment_dir}/init.mp4"')
-    run_cmd(f'mv "{tmp}"/*.m4s "{segment_dir}/"')
+    mpd = next(Path(tmp).glob("*_dash.mpd"), None)
+    if mpd is None:
+        raise RuntimeError(f"MP4Box did not write an MPD into {tmp}")
+    shutil.move(str(mpd), f"{segment_dir}/intermediate_dash.mpd")
+    shutil.move(f"{tmp}/init.mp4", f"{segment_dir}/init.mp4")
+    for m4s in Path(tmp).glob("*.m4s"):
+        shutil.move(str(m4s), f"{segment_dir}/{m4s.name}")
 
     rm(tmp)
 
-    # Segment timing info
-    segments = int(run_cmd(f'ls "{segment_dir}" | grep -E "^[0-9]+\\.m4s$" | wc -l'))
-    seg_info: Dict[int, Dict[str, float]] = {}
-    for seg in range(1, segments + 1):
-        raw = run_cmd(f'MP4Box -std -diso "{segment_dir}/{seg}.m4s" 2>&1 | grep "SegmentIndexBox"')
-        timescale = int(get_attr(raw, "timescale"))
-        earliest = int(get_attr(raw, "earliest_presentation_time"))
-        seg_info[seg] = {"start_time": earliest / timescale}
+    # Segment timing info, read in the same directory pass that finds the segments
+    starts = {
+        int(e.name[:-len(".m4s")]): read_sidx_start(e.path)
+        for e in os.scandir(segment_dir)
+        if SEGMENT_RE.match(e.name)
+    }
+    seg_info: Dict[int, Dict[str, float]] = {seg: {"start_time": starts[seg]} for seg in sorted(starts)}
     return seg_info
 
 
@@ -111,30 +259,29 @@ def build_common_manifest(video_name: str, rates: List[int]) -> Dict[int, Dict[s
     """
     tracks_dir = f"videos/{video_name}/tracks"
     base = None
+    base_adaptation_set = None
     info: Dict[int, Dict[str, int]] = {}
+    # Representation index of each rate, lowest bitrate first
+    order = {r: i for i, r in enumerate(sorted(rates))}
 
     for rate in rates:
         segment_dir = f"{tracks_dir}/video_{rate}"
         manifest = f"{segment_dir}/intermediate_dash.mpd"
 
-        # Remove "Initialization" lines (match your old script behavior)
-        with open(manifest, "r") as f:
-            content = f.read()
-        content = "\n".join([l for l in content.split("\n") if "Initialization" not in l])
-        with open(manifest, "w") as f:
-            f.write(content)
-
         tree = et.parse(manifest).getroot()
-        root = tree[1][0]
 
-        representation = None
-        for child in root:
-            if "Representation" in child.tag:
-                representation = child
-        if representation is None:
+        # Remove <Initialization> elements (match your old script behavior)
+        for parent in list(tree.iter()):
+            for child in parent.findall("d:Initialization", MPD_NS):
+                parent.remove(child)
+
+        adaptation_set = tree.find("d:Period/d:AdaptationSet", MPD_NS)
+        representations = [] if adaptation_set is None else adaptation_set.findall("d:Representation", MPD_NS)
+        if not representations:
             raise RuntimeError(f"Could not find Representation in {manifest}")
+        representation = representations[-1]
 
-        pl = sorted(rates).index(rate)
+        pl = order[rate]
         representation.set("id", f"video{pl}")
 
         info[rate] = {
@@ -144,11 +291,14 @@ def build_common_manifest(video_name: str, rates: List[int]) -> Dict[int, Dict[s
 
         if base is None:
             base = tree
-            segment_template = tree[1][0][0]
+            base_adaptation_set = adaptation_set
+            segment_template = adaptation_set.find("d:SegmentTemplate", MPD_NS)
+            if segment_template is None:
+                raise RuntimeError(f"Could not find SegmentTemplate in {manifest}")
             segment_template.set("initialization", "$RepresentationID$/init.mp4")
             segment_template.set("media", "$RepresentationID$/$Number$.m4s")
         else:
-            base[1][0].append(representation)
+            base_adaptation_set.append(representation)
 
     out_manifest = f"{tracks_dir}/manifest.mpd"
     rm(out_manifest)
@@ -158,17 +308,108 @@ def build_common_manifest(video_name: str, rates: List[int]) -> Dict[int, Dict[s
     return info
 
 
-def convert_to_yuv(video_name: str, mp4_path: str, width: int, height: int, tag: str) -> str:
+def vmaf_filter(w: int, h: int) -> str:
     """
-    Convert mp4 to yuv420p scaled to width/height at videos/<name>/yuv/<tag>.yuv
+    Filter chain bringing a decoded rep to the VMAF input format: w x h at VMAF_FPS.
+    Decimates first, so only the frames that are kept get scaled.
     """
-    ensure_dir(f"videos/{video_name}/yuv")
-    out_yuv = f"videos/{video_name}/yuv/{tag}.yuv"
-    run_cmd(
-        f'ffmpeg -y -i "{mp4_path}" -pix_fmt yuv420p -vsync 0 -vf scale={width}:{height} "{out_yuv}"',
-        verbose=True
-    )
-    return out_yuv
+    return f"fps={VMAF_FPS},scale={w}:{h}"
+
+
+def libvmaf_model_option(vmaf_model: str) -> str:
+    """
+    libvmaf filter option selecting vmaf_model, in the form this ffmpeg takes:
+    model=path=... (ffmpeg >= 5, libvmaf 2.x) or model_path=... (ffmpeg 4.x).
+    """
+    out = run_cmd(["ffmpeg", "-nostdin", "-hide_banner", "-h", "filter=libvmaf"])
+    options = {line.split()[0] for line in out.splitlines() if line.strip()}
+    if "model" in options:
+        return f"model=path={vmaf_model}"
+    return f"model_path={vmaf_model}"
+
+
+def decode_yuv_cmd(mp4_path: str, w: int, h: int, out_path: str) -> List[str]:
+    """
+    ffmpeg argv decoding all of mp4_path to raw yuv420p at w x h and VMAF_FPS.
+    """
+    return [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error",
+        "-i", mp4_path,
+        "-an", "-vf", vmaf_filter(w, h),
+        "-pix_fmt", "yuv420p", "-f", "rawvideo", out_path,
+    ]
+
+
+def run_with_fifo_inputs(cmd: List[str], feeders: Dict[str, List[str]]) -> None:
+    """
+    Run cmd alongside feeder commands (fifo -> argv) that write its inputs into
+    named pipes, so the inputs are streamed between processes and never hit the disk.
+    Raises CalledProcessError if cmd or any feeder fails.
+    """
+    # Several of these run at once; none of them may read the terminal
+    feeds = {
+        fifo: subprocess.Popen(f, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        for fifo, f in feeders.items()
+    }
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+
+    released = set()
+    while True:
+        try:
+            proc.wait(timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        for fifo, f in feeds.items():
+            if f.poll() is None or fifo in released:
+                continue
+            if f.returncode != 0:
+                # A dead decoder means a bad input; don't score a partial stream
+                proc.kill()
+                break
+            # The feeder is done: make sure a reader still blocked in open() gets EOF
+            released.add(fifo)
+            try:
+                os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+    proc.wait()
+
+    killed = set()
+    for fifo, f in feeds.items():
+        # Either done already, or stuck on a pipe the reader never opened/drained
+        if f.poll() is None:
+            f.kill()
+            killed.add(fifo)
+        f.wait()
+
+    for fifo, f in feeds.items():
+        if fifo not in killed and f.returncode != 0:
+            raise CalledProcessError(f.returncode, f.args)
+    if proc.returncode != 0:
+        raise CalledProcessError(proc.returncode, cmd)
+
+
+def load_json(path: str) -> Any:
+    """
+    Parse a JSON file from bytes (orjson if installed, else stdlib json).
+    """
+    with open(path, "rb") as f:
+        if orjson is not None:
+            return orjson.loads(f.read())
+        return json.load(f)
+
+
+def dump_json(path: str, obj: Any) -> None:
+    """
+    Write obj as JSON (orjson if installed, else stdlib json). Int keys are
+    written as strings either way, like json.dumps does.
+    """
+    with open(path, "wb") as f:
+        if orjson is not None:
+            f.write(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+        else:
+            f.write(json.dumps(obj).encode("utf-8"))
 
 
 def extract_vmaf_score(v: Any) -> float:
@@ -199,30 +440,142 @@ def extract_vmaf_score(v: Any) -> float:
         if "vmaf" in m and isinstance(m["vmaf"], dict) and "mean" in m["vmaf"]:
             return float(m["vmaf"]["mean"])
 
-    # 4) Fall back: walk JSON
-    def walk(x: Any) -> Optional[float]:
+    # 4) Fall back: walk JSON (iterative, so big per-frame logs don't recurse per node;
+    #    numeric hits in a dict are taken before descending into its children)
+    targets = frozenset(("vmaf_score", "vmaf"))
+    stack: List[Any] = [v]
+    while stack:
+        x = stack.pop()
         if isinstance(x, dict):
+            children = []
             for k, val in x.items():
-                lk = str(k).lower()
-                if lk in ("vmaf_score", "vmaf") and isinstance(val, (int, float)):
+                if isinstance(val, (dict, list)):
+                    children.append(val)
+                elif isinstance(val, (int, float)) and str(k).lower() in targets:
                     return float(val)
-                r = walk(val)
-                if r is not None:
-                    return r
-        if isinstance(x, list):
-            for it in x:
-                r = walk(it)
-                if r is not None:
-                    return r
-        return None
-
-    r = walk(v)
-    if r is not None:
-        return float(r)
+            stack.extend(reversed(children))
+        elif isinstance(x, list):
+            stack.extend(reversed(x))
 
     raise KeyError(f"Could not find VMAF score in JSON. Top-level keys: {list(v.keys()) if isinstance(v, dict) else type(v)}")
 
 
+def frame_scores(v: Any) -> List[float]:
+    """
+    Per-frame VMAF scores from a vmafossexec/libvmaf JSON log, in frame order.
+    """
+    frames = v.get("frames") if isinstance(v, dict) else None
+    if not isinstance(frames, list) or not frames:
+        raise KeyError("Could not find per-frame scores ('frames') in VMAF JSON")
+    frames = sorted(frames, key=lambda f: f.get("frameNum", 0))
+    return [extract_vmaf_score(f) for f in frames]
+
+
+def pool_by_segment(scores: List[float], starts: List[float]) -> List[float]:
+    """
+    Mean of the per-frame scores (at VMAF_FPS, from the start of the rep) that
+    fall into each segment; starts are the segment start times in order.
+    A segment too short to contain a frame (e.g. MP4Box's last segment when the
+    duration is just past a segment boundary) gets the last frame before its start.
+    """
+    sums = [0.0] * len(starts)
+    counts = [0] * len(starts)
+    for i, score in enumerate(scores):
+        # Assumes the fps filter emits frame i at starts[0] + i / VMAF_FPS
+        seg = max(0, bisect_right(starts, starts[0] + i / VMAF_FPS) - 1)
+        sums[seg] += score
+        counts[seg] += 1
+
+    pooled = []
+    for seg, (total, n) in enumerate(zip(sums, counts)):
+        if n:
+            pooled.append(total / n)
+        else:
+            frame = int((starts[seg] - starts[0]) * VMAF_FPS)
+            pooled.append(scores[min(max(frame, 0), len(scores) - 1)])
+    return pooled
+
+
+def score_rep(
+    rate: int,
+    starts: List[float],
+    w: int,
+    h: int,
+    ref_mp4: str,
+    dist_mp4: str,
+    vmaf_bin: str,
+    vmaf_model: str,
+    work_dir: str,
+    libvmaf_model: Optional[str],
+    threads: int,
+) -> Tuple[int, List[float]]:
+    """
+    VMAF of every segment of dist_mp4 against ref_mp4, both decoded at w x h.
+    Each input is decoded once for the whole rep and the per-frame scores are
+    averaged per segment (starts = segment start times in seconds).
+    With libvmaf_model (the filter's model option with a path relative to
+    work_dir, see libvmaf_model_option) a
+    single ffmpeg decodes both and scores them with the libvmaf filter; otherwise,
+    or if that run fails and vmafossexec is built, two decoders feed vmafossexec
+    through pipes.
+    Temp files are named after the rate under work_dir, so reps can be scored
+    concurrently. Returns (rate, [vmaf per segment]).
+    """
+    prefix = f"{work_dir}/{rate}"
+    log = f"{prefix}_vmaf.json"
+
+    if libvmaf_model is not None:
+        rm(log)  # a log left by an earlier, interrupted run must not be parsed
+        try:
+            # libvmaf takes the distorted input first, then the reference. It runs in
+            # work_dir with a relative log_path (and libvmaf_model is relative to
+            # work_dir), so no user-controlled path ends up inside the filter string.
+            run_cmd(
+                [
+                    "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+                    "-i", dist_mp4,
+                    "-i", ref_mp4,
+                    "-lavfi",
+                    f"[0:v]{vmaf_filter(w, h)}[dist];"
+                    f"[1:v]{vmaf_filter(w, h)}[ref];"
+                    f"[dist][ref]libvmaf={libvmaf_model}:n_threads={threads}:"
+                    f"log_fmt=json:log_path={os.path.basename(log)}",
+                    "-f", "null", "-",
+                ],
+                capture=False,
+                cwd=work_dir,
+            )
+            scores = frame_scores(load_json(log))
+            run_cmd(["rm", "-f", log], capture=False)
+            return rate, pool_by_segment(scores, starts)
+        except (CalledProcessError, OSError, KeyError):
+            # Also covers a libvmaf build that exits without writing a usable log
+            # (e.g. ffmpeg 4.x unable to load the .json model)
+            if not os.path.isfile(vmaf_bin):
+                raise
+            print(f"> libvmaf run for rate {rate} failed, falling back to vmafossexec")
+
+    ref_fifo = f"{prefix}_ref.fifo"
+    dist_fifo = f"{prefix}_dist.fifo"
+    for fifo in (ref_fifo, dist_fifo):
+        rm(fifo)
+        os.mkfifo(fifo)
+
+    # vmafossexec JSON logging (ref first, then distorted), fed by one decoder per input
+    run_with_fifo_inputs(
+        [vmaf_bin, "yuv420p", str(w), str(h), ref_fifo, dist_fifo, vmaf_model,
+         "--log", log, "--log-fmt", "json", "--thread", str(threads)],
+        {
+            ref_fifo: decode_yuv_cmd(ref_mp4, w, h, ref_fifo),
+            dist_fifo: decode_yuv_cmd(dist_mp4, w, h, dist_fifo),
+        },
+    )
+    scores = frame_scores(load_json(log))
+
+    run_cmd(["rm", "-f", ref_fifo, dist_fifo, log], capture=False)
+    return rate, pool_by_segment(scores, starts)
+
+
 def compute_vmaf(
     video_name: str,
     rates: List[int],
@@ -232,18 +585,20 @@ def compute_vmaf(
 ) -> None:
     """
     Produces videos/<name>/vmaf.json with per-segment VMAF, using highest rate as reference.
+    Uses ffmpeg's libvmaf filter when ffmpeg has it, else falls back to vmafossexec.
 
     IMPORTANT:
     Your vmafossexec build expects:
-      vmafossexec <fmt> <w> <h> <ref.yuv> <dist.yuv> <model.json> --log out.json --log-fmt json
+      vmafossexec <fmt> <w> <h> <ref.yuv> <dist.yuv> <model.json> --log out.json --log-fmt json [--thread N]
     NOT: --json -o ...
     """
     out_path = f"videos/{video_name}/vmaf.json"
     if os.path.isfile(out_path):
         return
 
+    has_libvmaf = ffmpeg_lists("filters", "libvmaf")
     vmaf_bin = "./deps/vmaf/libvmaf/build/tools/vmafossexec"
-    if not os.path.isfile(vmaf_bin):
+    if not has_libvmaf and not os.path.isfile(vmaf_bin):
         raise RuntimeError(f"VMAF binary not found at {vmaf_bin}")
 
     vmaf_model = "./deps/vmaf/model/vmaf_v0.6.1.json"
@@ -257,43 +612,51 @@ def compute_vmaf(
     w = info[biggest]["width"]
     h = info[biggest]["height"]
 
-    ref_yuv = convert_to_yuv(video_name, reps[biggest], w, h, f"video_{biggest}")
-
+    # Hoist every path handed to the per-rep workers, resolved once
+    vmaf_bin = abspath(vmaf_bin)
+    vmaf_model = abspath(vmaf_model)
+    ref_mp4 = abspath(reps[biggest])
+    work_dir = abspath(f"videos/{video_name}/tmp/vmaf")
+    ensure_dir(work_dir)
+    # Relative to work_dir this is only "../" steps plus the fixed deps/ path,
+    # so it needs no filter-option escaping
+    libvmaf_model = libvmaf_model_option(os.path.relpath(vmaf_model, work_dir)) if has_libvmaf else None
+
+    jobs = []
     for rate in rates:
-        cur_yuv = ref_yuv if rate == biggest else convert_to_yuv(video_name, reps[rate], w, h, f"video_{rate}")
-
-        segments = max(seg_info[rate].keys())
-        for seg in range(1, segments + 1):
-            ss = seg_info[rate][seg]["start_time"]
-            if seg < segments:
-                t = seg_info[rate][seg + 1]["start_time"] - ss
-            else:
-                t = seg_info[rate][seg]["start_time"] - seg_info[rate][seg - 1]["start_time"]
-
-            # cut both (10 fps to speed up VMAF; keep consistent between ref/dist)
-            run_cmd(
-                f'ffmpeg -y -s:v {w}x{h} -r 10 -i "{cur_yuv}" -ss {ss} -t {t} -pix_fmt yuv420p cut1.yuv',
-                verbose=True
-            )
-            run_cmd(
-                f'ffmpeg -y -s:v {w}x{h} -r 10 -i "{ref_yuv}" -ss {ss} -t {t} -pix_fmt yuv420p cut2.yuv',
-                verbose=True
-            )
-
-            # vmafossexec JSON logging (ref first, then distorted)
-            run_cmd(
-                f'{vmaf_bin} yuv420p {w} {h} cut2.yuv cut1.yuv "{vmaf_model}" '
-                f'--log vmaf_out.json --log-fmt json'
-            )
-
-            v = json.loads(open("vmaf_out.json", "r").read())
-            seg_info[rate][seg]["vmaf"] = extract_vmaf_score(v)
-
-            run_cmd("rm -f cut1.yuv cut2.yuv vmaf_out.json || true")
-
-    rm(f"videos/{video_name}/yuv")
-    with open(out_path, "w") as f:
-        f.write(json.dumps(seg_info))
+        if rate == biggest:
+            # Reference scored against itself is always a perfect match
+            for seg in seg_info[rate]:
+                seg_info[rate][seg]["vmaf"] = 100.0
+            continue
+        jobs.append(rate)
+
+    # One scoring run per rep (each input decoded once); reps are independent and
+    # run in parallel, and the cores are split between them
+    threads = max(VMAF_THREADS, (os.cpu_count() or 1) // max(1, len(jobs)))
+    workers = max(1, (os.cpu_count() or 1) // threads)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = []
+        for rate in jobs:
+            segs = sorted(seg_info[rate])
+            starts = [seg_info[rate][seg]["start_time"] for seg in segs]
+            futures.append(ex.submit(
+                score_rep, rate, starts, w, h, ref_mp4, abspath(reps[rate]),
+                vmaf_bin, vmaf_model, work_dir, libvmaf_model, threads,
+            ))
+        try:
+            for fut in as_completed(futures):
+                rate, scores = fut.result()
+                for seg, vmaf in zip(sorted(seg_info[rate]), scores):
+                    seg_info[rate][seg]["vmaf"] = vmaf
+        except BaseException:
+            # Don't start the queued reps once one has failed
+            for f in futures:
+                f.cancel()
+            raise
+
+    rm(work_dir)
+    dump_json(out_path, seg_info)
 
 
 def run(args: Namespace) -> None:
@@ -309,12 +672,15 @@ def run(args: Namespace) -> None:
         args.rates,
         fps=args.fps,
         seg_s=args.segment,
+        encoder=args.encoder,
     )
 
-    # 2) segment each rep
+    # 2) segment each rep (independent per rep, so run them concurrently)
     seg_info_all: Dict[int, Dict[int, Dict[str, float]]] = {}
-    for r in args.rates:
-        seg_info_all[r] = segment_rep(video_name, reps[r], r, args.segment)
+    with ThreadPoolExecutor(max_workers=len(args.rates)) as ex:
+        futures = {r: ex.submit(segment_rep, video_name, reps[r], r, args.segment) for r in args.rates}
+        for r in args.rates:
+            seg_info_all[r] = futures[r].result()
 
     # 3) build merged MPD
     info = build_common_manifest(video_name, args.rates)
@@ -340,5 +706,11 @@ if __name__ == "__main__":
         default=[300, 600, 1200, 2500],
         help="Bitrates (kbps) to generate (default: 300 600 1200 2500)",
     )
+    p.add_argument(
+        "--encoder",
+        choices=["auto", "libx264", "h264_nvenc"],
+        default="auto",
+        help="H.264 encoder for the reps (default auto: h264_nvenc if a GPU encode works, else libx264)",
+    )
     p.add_argument("-vmaf", action="store_true", help="Generate videos/<name>/vmaf.json (slow)")
     run(p.parse_args())